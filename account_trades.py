@@ -1,20 +1,12 @@
 import signal
 from datetime import datetime, timedelta
-from ibapi.client import EClient
-from ibapi.wrapper import EWrapper
 from ibapi.common import OrderId
 from ibapi.execution import Execution, ExecutionFilter
+from ibapi_base import BaseIBApp
 
 port = 7496
 
-class IBapi(EWrapper, EClient):
-    def __init__(self):
-        EClient.__init__(self, self)
-
-    def nextValidId(self, orderId: int):
-        self.nextOrderId = orderId
-        self.start()
-
+class IBapi(BaseIBApp):
     def start(self):
         # Request executions (trades)
         filter = ExecutionFilter()
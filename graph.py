@@ -1,14 +1,13 @@
+import os
 import signal
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from ibapi.client import EClient
-from ibapi.wrapper import EWrapper
-from ibapi.contract import Contract
-from ibapi.common import TickerId
+from ibapi_base import BaseIBApp, make_contract
 from calendar import monthrange
+from td_indicators import calculate_td_all
 
 port = 7496
 
@@ -20,6 +19,21 @@ CURRENCY = "USD"
 CONTRACT_MONTH = None  # Set to None for auto (current front month), or specify like "202603" for March 2026
 DATA_DURATION = "3 W"  # How much historical data to fetch
 BAR_SIZE = "15 mins"  # Bar size
+VERBOSE = os.environ.get("IBKR_VERBOSE", "") not in ("", "0")  # Print every bar and TD debug statistics
+
+# float32 keeps cent precision only below ~131072, enough for index and futures
+# prices; stocks can trade above that (e.g. BRK.A), so they keep float64
+PRICE_DTYPE = np.float64 if SEC_TYPE == "STK" else np.float32
+
+# Record layout of the bar buffer: the fixed-width date string followed by OHLCV
+BAR_DTYPE = np.dtype([
+    ('date', 'S17'),
+    ('open', PRICE_DTYPE),
+    ('high', PRICE_DTYPE),
+    ('low', PRICE_DTYPE),
+    ('close', PRICE_DTYPE),
+    ('volume', 'f8')
+])
 
 def get_front_month_contract():
     """Calculate the current front-month futures contract."""
@@ -51,13 +65,12 @@ def get_front_month_contract():
     
     # ES quarterly cycle: Mar(H), Jun(M), Sep(U), Dec(Z)
     # But also has all months, use quarterly for main contracts
-    quarterly_months = [3, 6, 9, 12]  # H, M, U, Z
+    quarterly_months = np.array([3, 6, 9, 12])  # H, M, U, Z
     
     # Find next quarterly month
-    for qm in quarterly_months:
-        if month <= qm:
-            month = qm
-            break
+    idx = np.searchsorted(quarterly_months, month)
+    if idx < len(quarterly_months):
+        month = int(quarterly_months[idx])
     else:
         # If past December, go to next year's March
         month = 3
@@ -65,199 +78,170 @@ def get_front_month_contract():
     
     return f"{year}{month:02d}"
 
-def calculate_td_sequential(df):
-    """Calculate TD Sequential Setup"""
-    close = df['Close'].values
-    setup_count = np.zeros(len(df))
-    
-    for i in range(4, len(df)):
-        # Buy setup: close < close 4 bars ago
-        if close[i] < close[i-4]:
-            if i > 0 and setup_count[i-1] < 0:
-                setup_count[i] = setup_count[i-1] - 1
-            else:
-                setup_count[i] = -1
-            # Reset if we reach -9
-            if setup_count[i] <= -9:
-                setup_count[i] = -9
-        # Sell setup: close > close 4 bars ago
-        elif close[i] > close[i-4]:
-            if i > 0 and setup_count[i-1] > 0:
-                setup_count[i] = setup_count[i-1] + 1
-            else:
-                setup_count[i] = 1
-            # Reset if we reach 9
-            if setup_count[i] >= 9:
-                setup_count[i] = 9
-        else:
-            setup_count[i] = 0
-    
-    return setup_count
+def count_changes(counts, min_abs):
+    """Return the bar positions where a TD count of at least min_abs starts or changes."""
+    changed = np.ones(len(counts), dtype=bool)
+    changed[1:] = counts[1:] != counts[:-1]
+    return np.flatnonzero((np.abs(counts) >= min_abs) & changed)
 
-def calculate_td_combo(df):
-    """Calculate TD Combo"""
-    close = df['Close'].values
-    high = df['High'].values
-    low = df['Low'].values
-    
-    setup_count = np.zeros(len(df))
-    countdown_count = np.zeros(len(df))
-    in_countdown = False
-    countdown_direction = 0
-    
-    for i in range(4, len(df)):
-        # Setup phase (same as TD Sequential)
-        if not in_countdown:
-            if close[i] < close[i-4]:
-                if i > 0 and setup_count[i-1] < 0:
-                    setup_count[i] = setup_count[i-1] - 1
-                else:
-                    setup_count[i] = -1
-                    
-                if setup_count[i] <= -9:
-                    setup_count[i] = -9
-                    in_countdown = True
-                    countdown_direction = -1
-                    
-            elif close[i] > close[i-4]:
-                if i > 0 and setup_count[i-1] > 0:
-                    setup_count[i] = setup_count[i-1] + 1
-                else:
-                    setup_count[i] = 1
-                    
-                if setup_count[i] >= 9:
-                    setup_count[i] = 9
-                    in_countdown = True
-                    countdown_direction = 1
-            else:
-                setup_count[i] = 0
-        
-        # Countdown phase
-        if in_countdown and i >= 2:
-            countdown_count[i] = countdown_count[i-1]
-            
-            if countdown_direction == 1:  # Sell countdown
-                if close[i] > high[i-2]:
-                    countdown_count[i] += 1
-            else:  # Buy countdown
-                if close[i] < low[i-2]:
-                    countdown_count[i] -= 1
-            
-            # Complete at 13
-            if abs(countdown_count[i]) >= 13:
-                countdown_count[i] = 13 * countdown_direction
-                in_countdown = False
+def td_label_traces(x, y, counts, colors, fontsize, family, prefix=''):
+    """Build text traces labelling TD counts, one per (sell, buy) color."""
+    traces = []
+    texts = np.char.add(prefix, np.char.mod('%d', np.abs(counts)))
+    for direction, color in zip((1, -1), colors):
+        selected = np.sign(counts) == direction
+        if not selected.any():
+            continue
+        traces.append(
+            go.Scatter(
+                x=x[selected],
+                y=y[selected],
+                mode='text',
+                text=texts[selected],
+                textfont=dict(size=fontsize, color=color, family=family),
+                hoverinfo='skip',
+                showlegend=False
+            )
+        )
+    return traces
+
+def candlestick_gl_traces(x, opens, highs, lows, closes, name, increasing_color, decreasing_color,
+                          plot_width_px=1200):
+    """Build Scattergl traces drawing candlesticks as a thin wick and a thick body per bar."""
+    traces = []
+    ohlc = np.column_stack((opens, highs, lows, closes))
+    # WebGL line widths are in pixels, so size the bodies to ~60% of the bar
+    # spacing on a plot of about plot_width_px (they do not rescale on zoom)
+    body_width = int(np.clip(0.6 * plot_width_px / max(len(x), 1), 1, 12))
+    increasing = closes > opens
+    for selected, color in ((increasing, increasing_color), (~increasing, decreasing_color)):
+        if not selected.any():
+            continue
+        # Each bar is a vertical segment: two points followed by a NaN gap
+        bar_x = np.repeat(x[selected], 3)
+        customdata = np.repeat(ohlc[selected], 3, axis=0)
+        for start, stop, width, hover in ((lows, highs, 1, True), (opens, closes, body_width, False)):
+            y = np.full((np.count_nonzero(selected), 3), np.nan)
+            y[:, 0] = start[selected]
+            y[:, 1] = stop[selected]
+            traces.append(
+                go.Scattergl(
+                    x=bar_x,
+                    y=y.ravel(),
+                    mode='lines',
+                    name=name,
+                    line=dict(color=color, width=width),
+                    customdata=customdata,
+                    hovertemplate=(
+                        'Open: %{customdata[0]:.2f}<br>High: %{customdata[1]:.2f}<br>'
+                        'Low: %{customdata[2]:.2f}<br>Close: %{customdata[3]:.2f}'
+                    ) if hover else None,
+                    hoverinfo=None if hover else 'skip',
+                    showlegend=False
+                )
+            )
     
-    return setup_count, countdown_count
+    # A doji (open == close) has a zero-length body, so mark it with a tick
+    doji = closes == opens
+    if doji.any():
+        traces.append(
+            go.Scattergl(
+                x=x[doji],
+                y=closes[doji],
+                mode='markers',
+                name=name,
+                marker=dict(symbol='line-ew', size=body_width + 2, line=dict(color=decreasing_color, width=1)),
+                hoverinfo='skip',
+                showlegend=False
+            )
+        )
+    return traces
 
-class IBapi(EWrapper, EClient):
+class IBapi(BaseIBApp):
     def __init__(self):
-        EClient.__init__(self, self)
-        self.dates = []
-        self.opens = []
-        self.highs = []
-        self.lows = []
-        self.closes = []
-        self.volumes = []
-
-    def nextValidId(self, orderId: int):
-        self.nextOrderId = orderId
-        self.start()
+        super().__init__()
+        # Preallocated bar buffer, filled up to self.n and doubled when full
+        self.n = 0
+        self._bars = np.empty(16384, dtype=BAR_DTYPE)
 
     def start(self):
-        contract = Contract()
-        contract.symbol = SYMBOL
-        contract.secType = SEC_TYPE
-        contract.exchange = EXCHANGE
-        contract.currency = CURRENCY
-        
         # Set contract month for futures
+        month = None
         if SEC_TYPE == "FUT":
-            contract.lastTradeDateOrContractMonth = CONTRACT_MONTH if CONTRACT_MONTH else get_front_month_contract()
-            print(f"Trading contract: {SYMBOL} {contract.lastTradeDateOrContractMonth}")
+            month = CONTRACT_MONTH if CONTRACT_MONTH else get_front_month_contract()
+            print(f"Trading contract: {SYMBOL} {month}")
+        contract = make_contract(SYMBOL, SEC_TYPE, EXCHANGE, CURRENCY, month)
 
         # Request historical data - empty string means "now"
         # useRTH = 0 to include all trading hours (extended/overnight), not just regular hours
         self.reqHistoricalData(1, contract, "", DATA_DURATION, BAR_SIZE, "TRADES", 0, 1, False, [])
 
     def historicalData(self, reqId, bar):
-        print(f"Date: {bar.date}, Open: {bar.open}, High: {bar.high}, Low: {bar.low}, Close: {bar.close}, Volume: {bar.volume}")
-        # Store data for graphing
-        # Remove timezone portion if present (e.g., "20260123 06:30:00 America/Los_Angeles")
-        date_str = bar.date.split()[0] + ' ' + bar.date.split()[1]
-        self.dates.append(datetime.strptime(date_str, "%Y%m%d %H:%M:%S"))
-        self.opens.append(bar.open)
-        self.highs.append(bar.high)
-        self.lows.append(bar.low)
-        self.closes.append(bar.close)
-        self.volumes.append(bar.volume)
+        if VERBOSE:
+            print(f"Date: {bar.date}, Open: {bar.open}, High: {bar.high}, Low: {bar.low}, Close: {bar.close}, Volume: {bar.volume}")
+        # Store data for graphing, growing the buffer when full
+        if self.n == len(self._bars):
+            self._bars = np.resize(self._bars, 2 * self.n)
+        # Remove timezone portion if present (e.g., "20260123 06:30:00 America/Los_Angeles");
+        # the date itself is fixed width, so a slice is enough
+        self._bars[self.n] = (bar.date[:17].encode(), bar.open, bar.high, bar.low, bar.close, bar.volume)
+        self.n += 1
 
     def historicalDataEnd(self, reqId, start, end):
         print("Historical data request completed")
         
-        # Create DataFrame for mplfinance
-        df = pd.DataFrame({
-            'Open': pd.to_numeric(self.opens),
-            'High': pd.to_numeric(self.highs),
-            'Low': pd.to_numeric(self.lows),
-            'Close': pd.to_numeric(self.closes),
-            'Volume': pd.to_numeric(self.volumes)
-        }, index=pd.DatetimeIndex(self.dates))
+        # Split the bars received into contiguous columns and parse the dates in bulk
+        bars = self._bars[:self.n]
+        opens, highs, lows, closes, volumes = (
+            np.ascontiguousarray(bars[name]) for name in ('open', 'high', 'low', 'close', 'volume')
+        )
+        dates = pd.to_datetime(bars['date'].astype('U17'), format="%Y%m%d %H:%M:%S", cache=True)
         
-        # Calculate TD indicators
-        td_seq = calculate_td_sequential(df)
-        td_combo_setup, td_combo_countdown = calculate_td_combo(df)
+        # Calculate TD indicators straight from the price arrays; no DataFrame
+        # is needed since the chart is also built from the arrays
+        td_seq, _, td_combo_countdown = calculate_td_all(closes, highs, lows)
         
         # Debug: print some statistics
-        print(f"TD Sequential - Min: {td_seq.min()}, Max: {td_seq.max()}")
-        print(f"TD Combo Countdown - Min: {td_combo_countdown.min()}, Max: {td_combo_countdown.max()}")
-        print(f"Number of TD Sequential 8-9: {np.sum(np.abs(td_seq) >= 8)}")
-        print(f"Number of TD Combo Countdown values: {np.sum(td_combo_countdown != 0)}")
+        if VERBOSE:
+            print(f"TD Sequential - Min: {td_seq.min()}, Max: {td_seq.max()}")
+            print(f"TD Combo Countdown - Min: {td_combo_countdown.min()}, Max: {td_combo_countdown.max()}")
+            print(f"Number of TD Sequential 8-9: {np.count_nonzero(np.abs(td_seq) >= 8)}")
+            print(f"Number of TD Combo Countdown values: {np.count_nonzero(td_combo_countdown)}")
         
-        # Create annotations for TD Sequential
-        annotations = []
-        for i, (date, value) in enumerate(zip(df.index, td_seq)):
-            if value != 0 and abs(value) >= 6:
-                # Only show when count changes or is at 9 (completion)
-                if i == 0 or td_seq[i] != td_seq[i-1]:
-                    color = 'red' if value > 0 else 'green'
-                    annotations.append(
-                        dict(
-                            x=i, y=df['High'].iloc[i] * 1.003,
-                            text=str(int(abs(value))),
-                            fontsize=9,
-                            color=color,
-                            weight='bold'
-                        )
-                    )
+        # Create labels for TD Sequential
+        # Only show when count changes or is at 9 (completion)
+        seq_idx = count_changes(td_seq, 6)
+        label_traces = td_label_traces(
+            dates.values[seq_idx], highs[seq_idx] * 1.003, td_seq[seq_idx],
+            colors=('red', 'green'), fontsize=9, family='Arial Black'
+        )
         
-        # Add TD Combo countdown annotations
-        for i, (date, value) in enumerate(zip(df.index, td_combo_countdown)):
-            if value != 0 and abs(value) >= 1:
-                # Only show when countdown changes
-                if i == 0 or td_combo_countdown[i] != td_combo_countdown[i-1]:
-                    color = 'darkred' if value > 0 else 'darkgreen'
-                    annotations.append(
-                        dict(
-                            x=i, y=df['Low'].iloc[i] * 0.997,
-                            text=f"C{int(abs(value))}",
-                            fontsize=8,
-                            color=color,
-                            style='italic'
-                        )
-                    )
+        # Add TD Combo countdown labels
+        # Only show when countdown changes
+        cd_idx = count_changes(td_combo_countdown, 1)
+        label_traces += td_label_traces(
+            dates.values[cd_idx], lows[cd_idx] * 0.997, td_combo_countdown[cd_idx],
+            colors=('darkred', 'darkgreen'), fontsize=8, family='Arial', prefix='C'
+        )
         
-        print(f"Total annotations to add: {len(annotations)}")
+        print(f"Total annotations to add: {len(seq_idx) + len(cd_idx)}")
         
         # Detect trading hours pattern to determine if we should close gaps
         # Check time differences between consecutive bars
-        time_diffs = df.index.to_series().diff().dropna()
-        median_diff = time_diffs.median()
-        max_diff = time_diffs.max()
-        
-        # If max gap is much larger than median (e.g., overnight/weekend gaps),
-        # this is likely a regular hours market - apply rangebreaks
-        has_gaps = max_diff > median_diff * 5
+        # asi8 is in the index's own unit (ns or us depending on the pandas version)
+        time_diffs = np.diff(dates.asi8)
+        unit = np.datetime_data(dates.dtype)[0]
+        if len(time_diffs):
+            median_diff = pd.Timedelta(int(np.median(time_diffs)), unit=unit)
+            max_diff = pd.Timedelta(int(time_diffs.max()), unit=unit)
+            
+            # If max gap is much larger than median (e.g., overnight/weekend gaps),
+            # this is likely a regular hours market - apply rangebreaks
+            has_gaps = max_diff > median_diff * 5
+        else:
+            # A single bar has no intervals to compare
+            median_diff = max_diff = pd.NaT
+            has_gaps = False
         
         print(f"Median bar interval: {median_diff}")
         print(f"Max gap detected: {max_diff}")
@@ -272,26 +256,18 @@ class IBapi(EWrapper, EClient):
             subplot_titles=(f'{SYMBOL} with TD Sequential & TD Combo', 'Volume')
         )
         
-        # Add candlestick chart
-        fig.add_trace(
-            go.Candlestick(
-                x=df.index,
-                open=df['Open'],
-                high=df['High'],
-                low=df['Low'],
-                close=df['Close'],
-                name=SYMBOL,
-                increasing_line_color='green',
-                decreasing_line_color='red'
-            ),
-            row=1, col=1
-        )
+        # Add candlestick chart, drawn with WebGL line traces
+        for trace in candlestick_gl_traces(
+            dates.values, opens, highs, lows, closes,
+            name=SYMBOL, increasing_color='green', decreasing_color='red'
+        ):
+            fig.add_trace(trace, row=1, col=1)
         
         # Add volume bars
         fig.add_trace(
             go.Bar(
-                x=df.index,
-                y=df['Volume'],
+                x=dates,
+                y=volumes,
                 name='Volume',
                 marker_color='lightgray',
                 showlegend=False
@@ -299,28 +275,12 @@ class IBapi(EWrapper, EClient):
             row=2, col=1
         )
         
-        # Add annotations to plotly
-        plotly_annotations = []
-        for ann in annotations:
-            plotly_annotations.append(
-                dict(
-                    x=df.index[ann['x']],
-                    y=ann['y'],
-                    text=ann['text'],
-                    showarrow=False,
-                    font=dict(
-                        size=ann['fontsize'],
-                        color=ann['color'],
-                        family='Arial Black' if ann.get('weight') == 'bold' else 'Arial'
-                    ),
-                    xref='x',
-                    yref='y'
-                )
-            )
+        # Add TD labels, one text trace per color
+        for trace in label_traces:
+            fig.add_trace(trace, row=1, col=1)
         
         # Build layout configuration
         layout_config = dict(
-            annotations=plotly_annotations,
             title=f'{SYMBOL} - Interactive Candlestick Chart with TD Indicators',
             yaxis_title='Price (USD)',
             yaxis2_title='Volume',
@@ -340,12 +300,6 @@ class IBapi(EWrapper, EClient):
         
         self.disconnect()
 
-    def tickPrice(self, reqId: TickerId, tickType: int, price: float, attrib):
-        print(f"Tick Price. Ticker Id: {reqId}, tickType: {tickType}, Price: {price}")
-
-    def tickSize(self, reqId: TickerId, tickType: int, size: int):
-        print(f"Tick Size. Ticker Id: {reqId}, tickType: {tickType}, Size: {size}")
-
 def signal_handler(sig, frame):
     print('Disconnecting...')
     app.disconnect()
@@ -1,26 +1,12 @@
 import signal
 from datetime import datetime, timedelta
-from ibapi.client import EClient
-from ibapi.wrapper import EWrapper
-from ibapi.contract import Contract
-from ibapi.common import TickerId
+from ibapi_base import BaseIBApp, make_contract
 
 port = 7496
 
-class IBapi(EWrapper, EClient):
-    def __init__(self):
-        EClient.__init__(self, self)
-
-    def nextValidId(self, orderId: int):
-        self.nextOrderId = orderId
-        self.start()
-
+class IBapi(BaseIBApp):
     def start(self):
-        contract = Contract()
-        contract.symbol = "SPX"
-        contract.secType = "IND"
-        contract.exchange = "CBOE"
-        contract.currency = "USD"
+        contract = make_contract("SPX", "IND", "CBOE", "USD")
 
         # Request historical data
         end_date_time = (datetime.now() - timedelta(days=7)).strftime("%Y%m%d-%H:%M:%S")
@@ -33,12 +19,6 @@ class IBapi(EWrapper, EClient):
         print("Historical data request completed")
         self.disconnect()
 
-    def tickPrice(self, reqId: TickerId, tickType: int, price: float, attrib):
-        print(f"Tick Price. Ticker Id: {reqId}, tickType: {tickType}, Price: {price}")
-
-    def tickSize(self, reqId: TickerId, tickType: int, size: int):
-        print(f"Tick Size. Ticker Id: {reqId}, tickType: {tickType}, Size: {size}")
-
 def signal_handler(sig, frame):
     print('Disconnecting...')
     app.disconnect()
@@ -0,0 +1,30 @@
+from ibapi.client import EClient
+from ibapi.wrapper import EWrapper
+from ibapi.contract import Contract
+from ibapi.common import TickerId
+
+def make_contract(symbol, sec_type, exchange, currency, month=None):
+    """Build a Contract, setting the contract month when one is given (futures)."""
+    contract = Contract()
+    contract.symbol = symbol
+    contract.secType = sec_type
+    contract.exchange = exchange
+    contract.currency = currency
+    if month:
+        contract.lastTradeDateOrContractMonth = month
+    return contract
+
+class BaseIBApp(EWrapper, EClient):
+    """Common IB client boilerplate; subclasses implement start() to issue their requests."""
+    def __init__(self):
+        EClient.__init__(self, self)
+
+    def nextValidId(self, orderId: int):
+        self.nextOrderId = orderId
+        self.start()
+
+    def tickPrice(self, reqId: TickerId, tickType: int, price: float, attrib):
+        print(f"Tick Price. Ticker Id: {reqId}, tickType: {tickType}, Price: {price}")
+
+    def tickSize(self, reqId: TickerId, tickType: int, size: int):
+        print(f"Tick Size. Ticker Id: {reqId}, tickType: {tickType}, Size: {size}")
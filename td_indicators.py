@@ -0,0 +1,158 @@
+import numpy as np
+from _njit import njit, NUMBA_AVAILABLE
+
+# Explicit kernel signatures so Numba compiles eagerly at import (and caches
+# the result) rather than on the first call; prices may be float32 or float64
+if NUMBA_AVAILABLE:
+    from numba import types, int8, float32, float64
+    _ALL_SIGS = [types.UniTuple(int8[::1], 3)(t[::1], t[::1], t[::1]) for t in (float32, float64)]
+else:
+    _ALL_SIGS = None
+
+def _price_arrays(*arrays):
+    """Return the arrays as contiguous, writeable float32 if they all are, otherwise float64"""
+    arrays = [np.asarray(a) for a in arrays]
+    dtype = np.float32 if all(a.dtype == np.float32 for a in arrays) else np.float64
+    # The kernel signatures only accept writeable arrays, so read-only input
+    # (e.g. Series.values under pandas copy-on-write) is copied
+    return [np.require(a, dtype, ['C', 'W']) for a in arrays]
+
+def _setup_directions(close):
+    """Direction of each bar versus the close 4 bars ago: -1 buy, 1 sell, 0 neither"""
+    diff = close - np.roll(close, 4)
+    diff[:4] = 0
+    # Comparisons rather than np.sign, so a NaN close gives 0 like the loop does
+    return (diff > 0).astype(np.int8) - (diff < 0)
+
+def _run_starts(sign):
+    """Index of the bar where each bar's run of equal directions began"""
+    bars = np.arange(len(sign))
+    reset = sign != np.r_[0, sign[:-1]]
+    return np.maximum.accumulate(np.where(reset, bars, 0))
+
+def _setup_counts(sign):
+    """Vectorized setup count for a run of bar directions starting from a zero count"""
+    # The setup count is the length of the current run of equal directions,
+    # capped at 9; a run restarts wherever the direction changes
+    bars = np.arange(len(sign))
+    return np.clip((bars - _run_starts(sign) + 1) * sign, -9, 9).astype(np.int8)
+
+def calculate_td_sequential(close):
+    """Calculate TD Sequential Setup from an array of closes"""
+    close, = _price_arrays(close)
+    # The standalone setup count vectorizes fully, so it needs no JIT kernel;
+    # the fused _td_all computes the same values alongside TD Combo
+    return _setup_counts(_setup_directions(close))
+
+@njit(_ALL_SIGS, cache=True)
+def _td_all(close, high, low):
+    seq_count = np.zeros(len(close), dtype=np.int8)
+    setup_count = np.zeros(len(close), dtype=np.int8)
+    countdown_count = np.zeros(len(close), dtype=np.int8)
+    in_countdown = False
+    countdown_direction = 0
+    
+    for i in range(4, len(close)):
+        # Buy (-1) or sell (1) direction versus the close 4 bars ago,
+        # shared by both setups
+        if close[i] < close[i-4]:
+            direction = -1
+        elif close[i] > close[i-4]:
+            direction = 1
+        else:
+            direction = 0
+        
+        # TD Sequential setup: extend the run in the same direction, cap at 9
+        if direction * seq_count[i-1] > 0:
+            seq_count[i] = seq_count[i-1] + direction
+        else:
+            seq_count[i] = direction
+        if abs(seq_count[i]) >= 9:
+            seq_count[i] = 9 * direction
+        
+        # TD Combo setup, paused while a countdown is running
+        if not in_countdown:
+            if direction * setup_count[i-1] > 0:
+                setup_count[i] = setup_count[i-1] + direction
+            else:
+                setup_count[i] = direction
+            if abs(setup_count[i]) >= 9:
+                setup_count[i] = 9 * direction
+                in_countdown = True
+                countdown_direction = direction
+        
+        # Countdown phase
+        if in_countdown:
+            countdown_count[i] = countdown_count[i-1]
+            
+            if countdown_direction == 1:  # Sell countdown
+                if close[i] > high[i-2]:
+                    countdown_count[i] += 1
+            else:  # Buy countdown
+                if close[i] < low[i-2]:
+                    countdown_count[i] -= 1
+            
+            # Complete at 13
+            if abs(countdown_count[i]) >= 13:
+                countdown_count[i] = 13 * countdown_direction
+                in_countdown = False
+    
+    return seq_count, setup_count, countdown_count
+
+def _td_all_vectorized(close, high, low):
+    """NumPy equivalent of _td_all, working one setup/countdown segment at a time"""
+    n = len(close)
+    bars = np.arange(n)
+    sign = _setup_directions(close)
+    run_start = _run_starts(sign)
+    setup_count = np.zeros(n, dtype=np.int8)
+    countdown_count = np.zeros(n, dtype=np.int8)
+    
+    # Full-series work is done once up front: the bars completing the 9th bar of
+    # a run, and running totals of the sell countdown triggers (close above the
+    # high of 2 bars earlier) and buy triggers (close below the low)
+    completions = np.flatnonzero((bars - run_start == 8) & (sign != 0))
+    sell_triggers = np.zeros(n, dtype=np.int64)
+    buy_triggers = np.zeros(n, dtype=np.int64)
+    sell_triggers[2:] = np.cumsum(close[2:] > high[:-2])
+    buy_triggers[2:] = np.cumsum(close[2:] < low[:-2])
+    
+    # Each segment is a setup counted from zero at `start` until it reaches 9,
+    # then a countdown from that bar until it reaches 13
+    start = 4
+    while start < n:
+        # Either the run through `start` lasts 9 bars from it, or the setup
+        # completes with the next run of at least 9 bars
+        k = start + 8
+        if k >= n or sign[start] == 0 or run_start[k] > start:
+            j = np.searchsorted(completions, start + 8, side='right')
+            k = completions[j] if j < len(completions) else n
+        
+        stop = min(k + 1, n)
+        seg = slice(start, stop)
+        setup_count[seg] = (bars[seg] - np.maximum(run_start[seg], start) + 1) * sign[seg]
+        if k >= n:
+            break
+        
+        # The countdown includes the setup's completion bar and ends at its
+        # 13th trigger, or at the last bar if it never gets there
+        direction = int(sign[k])
+        triggers = sell_triggers if direction == 1 else buy_triggers
+        before = triggers[k-1]
+        end = min(np.searchsorted(triggers, before + 13), n - 1)
+        countdown_count[k:end+1] = (triggers[k:end+1] - before) * direction
+        start = end + 1
+    
+    return _setup_counts(sign), setup_count, countdown_count
+
+def calculate_td_all(close, high, low):
+    """Calculate TD Sequential setup plus TD Combo setup and countdown in one pass"""
+    close, high, low = _price_arrays(close, high, low)
+    if NUMBA_AVAILABLE:
+        return _td_all(close, high, low)
+    return _td_all_vectorized(close, high, low)
+
+def calculate_td_combo(close, high, low):
+    """Calculate TD Combo from arrays of closes, highs and lows"""
+    _, setup_count, countdown_count = calculate_td_all(close, high, low)
+    return setup_count, countdown_count